@@ -11,16 +11,27 @@ import { NextRequest } from "next/server";
 const serviceAdapter = new ExperimentalEmptyAdapter();
  
 // 2. Create the CopilotRuntime instance and utilize the AG-UI client
-//    to setup the connection with the ADK agent.
-const runtime = new CopilotRuntime({
+//    to setup the connection with the ADK agent. The agent server only sees
+//    this runtime (on loopback), so the browser's IP is forwarded for its
+//    per-client rate limit.
+const createRuntime = (clientIp: string) => new CopilotRuntime({
   agents: {
     // Our FastAPI endpoint URL
-    "my_agent": new HttpAgent({url: "http://localhost:8000/"}),
+    "my_agent": new HttpAgent({
+      url: "http://localhost:8000/",
+      headers: { "X-AGUI-Client-IP": clientIp },
+    }),
   }   
 });
+
+const getClientIp = (req: NextRequest) =>
+  req.headers.get("x-forwarded-for")?.split(",")[0].trim()
+  || req.headers.get("x-real-ip")
+  || "unknown";
  
 // 3. Build a Next.js API route that handles the CopilotKit runtime requests.
 export const POST = async (req: NextRequest) => {
+  const runtime = createRuntime(getClientIp(req));
   const { handleRequest } = copilotRuntimeNextJSAppRouterEndpoint({
     runtime, 
     serviceAdapter,
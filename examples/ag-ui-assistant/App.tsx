@@ -3,7 +3,7 @@ import { Send, Sparkles, User, MessageSquare, Settings } from 'lucide-react';
 import { AGUIRenderer } from './components/AGUIRenderer';
 import { SkeletonLoader } from './components/SkeletonLoader';
 import { SettingsModal } from './components/SettingsModal';
-import { generateAGUIResponse } from './services/llamacppService';
+import { generateAGUIResponse, cancelPrefetch, loadSessionHistory } from './services/llamacppService';
 import { ChatMessage } from './types';
 
 // Greeting default questions
@@ -25,6 +25,8 @@ const App: React.FC = () => {
   const [inputValue, setInputValue] = useState('');
   const [isLoading, setIsLoading] = useState(false);
   const [showSettings, setShowSettings] = useState(false);
+  // Cursor of the next older page of server-side history (null when fully loaded)
+  const [historyCursor, setHistoryCursor] = useState<string | null>(null);
 
   // Persistence State
   const [isDarkMode, setIsDarkMode] = useState(() => {
@@ -42,6 +44,8 @@ const App: React.FC = () => {
   });
 
   const messagesEndRef = useRef<HTMLDivElement>(null);
+  // Whether the suggestions of the last answer may still be prefetching on the server
+  const prefetchActiveRef = useRef(false);
 
   useEffect(() => {
     // Apply Dark Mode Class
@@ -57,6 +61,27 @@ const App: React.FC = () => {
     localStorage.setItem('agui_theme_color', themeColor);
   }, [themeColor]);
 
+  useEffect(() => {
+    // Restore the newest past answers from the server instead of regenerating them
+    loadSessionHistory()
+      .then(({ messages: history, nextCursor }) => {
+        if (history.length > 0) setMessages(prev => (prev.length === 0 ? history : prev));
+        setHistoryCursor(nextCursor);
+      })
+      .catch(error => console.error("Failed to load history", error));
+  }, []);
+
+  const loadOlderHistory = async () => {
+    if (!historyCursor) return;
+    try {
+      const { messages: older, nextCursor } = await loadSessionHistory(historyCursor);
+      setMessages(prev => [...older, ...prev]);
+      setHistoryCursor(nextCursor);
+    } catch (error) {
+      console.error("Failed to load older history", error);
+    }
+  };
+
   const scrollToBottom = () => {
     messagesEndRef.current?.scrollIntoView({ behavior: 'smooth' });
   };
@@ -95,6 +120,7 @@ const App: React.FC = () => {
       };
 
       setMessages(prev => [...prev, botMsg]);
+      prefetchActiveRef.current = (agUiResponse.suggestions || []).length > 0;
     } catch (error) {
       console.error("Failed to generate response", error);
     } finally {
@@ -106,6 +132,16 @@ const App: React.FC = () => {
     setInputValue(q);
   };
 
+  const onInputChange = (value: string) => {
+    setInputValue(value);
+    if (!prefetchActiveRef.current) return;
+    const lastSuggestions = [...messages].reverse().find(m => m.role === 'model')?.data?.suggestions || [];
+    if (!lastSuggestions.includes(value)) {
+      prefetchActiveRef.current = false;
+      cancelPrefetch();
+    }
+  };
+
   const renderSuggestions = (suggestions: string[]) => {
     if (!suggestions || suggestions.length === 0) return null;
 
@@ -191,6 +227,16 @@ const App: React.FC = () => {
         ) : (
           // Chat Stream
           <div className="space-y-8">
+            {historyCursor && (
+              <div className="flex justify-center">
+                <button
+                  onClick={loadOlderHistory}
+                  className={`text-xs px-4 py-2 rounded-full border border-slate-200 dark:border-app-border text-slate-500 dark:text-slate-400 hover:text-${themeColor}-600 dark:hover:text-${themeColor}-300 transition-colors`}
+                >
+                  Load older messages
+                </button>
+              </div>
+            )}
             {messages.map((msg) => (
               <div key={msg.id} className={`flex gap-4 ${msg.role === 'user' ? 'flex-row-reverse' : 'flex-row'}`}>
                 {/* Avatar */}
@@ -232,7 +278,7 @@ const App: React.FC = () => {
           <input
             type="text"
             value={inputValue}
-            onChange={(e) => setInputValue(e.target.value)}
+            onChange={(e) => onInputChange(e.target.value)}
             onKeyDown={(e) => e.key === 'Enter' && !isLoading && handleSendMessage(inputValue)}
             placeholder="Type your question here..."
             className={`w-full pl-6 pr-14 py-4 rounded-full border border-slate-300 dark:border-app-border bg-white dark:bg-app-card text-slate-900 dark:text-slate-100 placeholder:text-slate-400 focus:outline-none focus:ring-2 focus:ring-${themeColor}-500 focus:border-transparent shadow-sm transition-all`}
@@ -1,10 +1,40 @@
+import time
+
+# Taken before any other import so /ready's startup_seconds includes import cost
+_process_started = time.perf_counter()
+
 import os
-from enum import Enum
-from typing import List, Optional, Union, Annotated, Literal, Any
+import asyncio
+import gzip
+import hashlib
+import json
+import math
+import re
+import sqlite3
+import threading
+import uuid
+from abc import ABC, abstractmethod
+from contextlib import asynccontextmanager
+from enum import Enum, IntEnum
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple, Union, Annotated, Literal, Any
 from pydantic import BaseModel, Field, field_validator
-from openai import OpenAI
+from fastapi import FastAPI, HTTPException, Request, Response
+from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, StreamingResponse
+from starlette.background import BackgroundTask
 import logging
 
+try:
+    import orjson
+except ImportError:  # optional: faster serialization of columnar payloads
+    orjson = None
+
+try:
+    import brotli
+except ImportError:  # optional: enables `Content-Encoding: br`
+    brotli = None
+
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
@@ -93,12 +123,19 @@ class AGUIResponse(BaseModel):
 
 # --- 2. Google ADK Agent Logic ---
 
-def generate_ag_ui_response(prompt: str):
+@lru_cache(maxsize=None)
+def get_openai_client():
+    # The OpenAI SDK is the heaviest import of this module, so it loads on first use (or in warmup)
+    from openai import OpenAI
+
     # Connect to local llama.cpp server
-    client = OpenAI(
+    return OpenAI(
         base_url="http://localhost:9006/v1",
         api_key="***"
     )
+
+def generate_ag_ui_response(prompt: str):
+    client = get_openai_client()
     # listing models
     # models = client.models.list()
     # print(models)
@@ -174,13 +211,810 @@ def generate_ag_ui_response(prompt: str):
     return completion.choices[0].message.parsed
 
 
-# --- 3. FastAPI Server Setup ---
+# --- 3. Suggestion Prefetch ---
 
-from fastapi import FastAPI, HTTPException
-from fastapi.middleware.cors import CORSMiddleware
-import uvicorn
+PREFETCH_TTL_SECONDS = float(os.getenv("AGUI_PREFETCH_TTL", "120"))
+PREFETCH_MAX_CONCURRENCY = int(os.getenv("AGUI_PREFETCH_CONCURRENCY", "1"))
+SESSION_TTL_SECONDS = float(os.getenv("AGUI_SESSION_TTL", "86400"))
+
+
+class SuggestionPrefetcher:
+    """
+    Speculatively answers the follow-up suggestions of a response in the background.
+
+    Prefetch runs at low priority: it only starts while no interactive generation
+    is in flight in this process. Results live in the shared store with a short TTL,
+    keyed by (session, suggestion), so any worker can serve a clicked suggestion.
+    Cancelling bumps the session epoch, so results still being generated on other
+    workers are discarded instead of cached.
+    """
+
+    def __init__(self, ttl_seconds: float = PREFETCH_TTL_SECONDS, max_concurrency: int = PREFETCH_MAX_CONCURRENCY):
+        self.ttl_seconds = ttl_seconds
+        self._pending: Dict[str, asyncio.Task] = {}
+        self._running: set = set()
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._interactive = 0
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self._closed = False
+
+    @staticmethod
+    def _prefix(session_id: str) -> str:
+        return f"prefetch:{session_id}\x00"
+
+    @staticmethod
+    def _epoch_key(session_id: str) -> str:
+        return f"prefetch-epoch:{session_id}"
+
+    async def _epoch(self, session_id: str) -> int:
+        return int(await asyncio.to_thread(store.get, self._epoch_key(session_id)) or 0)
+
+    def interactive_started(self):
+        self._interactive += 1
+        self._idle.clear()
+
+    def interactive_finished(self):
+        self._interactive -= 1
+        if self._interactive <= 0:
+            self._interactive = 0
+            self._idle.set()
+
+    async def schedule(self, session_id: str, suggestions: List[str]):
+        """Start background generation for every suggestion not already cached or pending."""
+        if self._closed or admission.prefetch_slots <= 0:
+            return
+        epoch = await self._epoch(session_id)
+        for suggestion in suggestions:
+            key = self._prefix(session_id) + suggestion.strip()
+            if not suggestion.strip() or key in self._pending or await asyncio.to_thread(store.get, key) is not None:
+                continue
+            task = asyncio.create_task(self._prefetch(key, session_id, epoch))
+            self._pending[key] = task
+            task.add_done_callback(lambda t, key=key: self._pending.pop(key, None) if self._pending.get(key) is t else None)
+
+    async def cancel(self, session_id: str) -> int:
+        """Cancel outstanding prefetches of a session and drop their cached results."""
+        prefix = self._prefix(session_id)
+        cancelled = 0
+        for key, task in list(self._pending.items()):
+            if key.startswith(prefix):
+                task.cancel()
+                cancelled += 1
+        await asyncio.to_thread(store.incr, self._epoch_key(session_id), ttl_seconds=SESSION_TTL_SECONDS)
+        await asyncio.to_thread(store.delete_prefix, prefix)
+        return cancelled
+
+    async def take(self, session_id: str, message: str) -> Optional[AGUIResponse]:
+        """
+        Return the prefetched answer for `message`, awaiting it if still running here.
+        Every other prefetch of the session is cancelled, since the user moved on.
+        """
+        key = self._prefix(session_id) + message.strip()
+        task = self._pending.pop(key, None)
+        cached = await asyncio.to_thread(store.get, key)
+        await self.cancel(session_id)
+        if cached is not None:
+            if task is not None:
+                task.cancel()
+            return AGUIResponse.model_validate_json(cached)
+        if task is None:
+            return None
+        if key not in self._running:
+            # Still queued behind other work: answering interactively is faster than waiting.
+            task.cancel()
+            return None
+        try:
+            return await asyncio.shield(task)
+        except asyncio.CancelledError:
+            if task.cancelled():
+                return None
+            raise
+
+    async def shutdown(self):
+        """Stop scheduling and cancel everything still queued or running in this process."""
+        self._closed = True
+        tasks = list(self._pending.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def _prefetch(self, key: str, session_id: str, epoch: int) -> Optional[AGUIResponse]:
+        await self._idle.wait()
+        async with self._semaphore:
+            # Re-check after acquiring a slot: an interactive request may have arrived meanwhile.
+            await self._idle.wait()
+            try:
+                async with admission.slot(Priority.PREFETCH):
+                    self._running.add(key)
+                    # A cancelled task stops waiting here; the worker thread finishes and its result is dropped.
+                    response = await asyncio.to_thread(generate_ag_ui_response, key[len(self._prefix(session_id)):])
+            except AdmissionRejected:
+                logger.info(f"Prefetch shed for {key!r}: backend busy")
+                return None
+            except Exception as e:
+                logger.warning(f"Prefetch failed for {key!r}: {e}")
+                return None
+            finally:
+                self._running.discard(key)
+        if await self._epoch(session_id) == epoch:
+            await asyncio.to_thread(store.set, key, encode_agui_response(response), ttl_seconds=self.ttl_seconds)
+        return response
+
+
+prefetcher = SuggestionPrefetcher()
+
+
+# --- 4. Wire Encoding ---
+
+COMPRESS_MIN_BYTES = int(os.getenv("AGUI_COMPRESS_MIN_BYTES", "1024"))
+COMPRESS_OFFLOAD_BYTES = int(os.getenv("AGUI_COMPRESS_OFFLOAD_BYTES", "65536"))
+COLUMNAR_MIN_ROWS = int(os.getenv("AGUI_COLUMNAR_MIN_ROWS", "20"))
+
+
+def _dumps(payload: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(payload)
+    return json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def _encode_column(values: List[str]) -> Union[List[str], dict]:
+    # Dictionary-encode columns with many repeated values (status, category, yes/no...)
+    distinct = list(dict.fromkeys(values))
+    if len(distinct) * 2 > len(values):
+        return values
+    index = {value: i for i, value in enumerate(distinct)}
+    return {"dict": distinct, "codes": [index[value] for value in values]}
+
+
+def _to_columnar(component: dict) -> dict:
+    rows = component["rows"]
+    width = len(component["headers"])
+    if len(rows) < COLUMNAR_MIN_ROWS or width == 0 or any(len(row) != width for row in rows):
+        return component
+    encoded = {key: value for key, value in component.items() if key != "rows"}
+    encoded["encoding"] = "columnar"
+    encoded["columns"] = [_encode_column([row[i] for row in rows]) for i in range(width)]
+    return encoded
+
+
+def encode_agui_response(response: AGUIResponse, columnar: bool = False) -> bytes:
+    """
+    Serialize an already validated response straight to JSON bytes.
+    With `columnar`, large rectangular tables are sent as (dictionary-encoded) columns.
+    """
+    if not columnar:
+        return response.__pydantic_serializer__.to_json(response)
+    payload = response.model_dump(mode="json")
+    payload["components"] = [
+        _to_columnar(component) if component["type"] == ComponentType.TABLE.value else component
+        for component in payload["components"]
+    ]
+    return _dumps(payload)
+
+
+def _accepted_encodings(header: str) -> set:
+    accepted = set()
+    for part in header.split(","):
+        name, _, params = part.strip().partition(";")
+        params = params.replace(" ", "")
+        if name and params not in ("q=0", "q=0.0", "q=0.00", "q=0.000"):
+            accepted.add(name.lower())
+    return accepted
+
+
+# --- 5. Shared State ---
+
+STATE_BACKEND = os.getenv("AGUI_STATE_BACKEND", "memory")
+STATE_PATH = os.getenv("AGUI_STATE_PATH", ".agui_state.sqlite3")
+
+
+class SharedStore(ABC):
+    """
+    Key/value store with per-key expiry for caches, rate limits and sessions.
+
+    `MemoryStore` is private to one process; `SQLiteStore` is shared by every
+    worker process on the box.
+    """
+
+    @abstractmethod
+    def get(self, key: str) -> Optional[bytes]:
+        ...
+
+    @abstractmethod
+    def set(self, key: str, value: bytes, ttl_seconds: Optional[float] = None):
+        ...
+
+    @abstractmethod
+    def delete(self, key: str):
+        ...
+
+    @abstractmethod
+    def delete_prefix(self, prefix: str):
+        ...
+
+    @abstractmethod
+    def incr(self, key: str, amount: int = 1, ttl_seconds: Optional[float] = None) -> int:
+        ...
+
+    @abstractmethod
+    def take_token(self, key: str, rate_per_second: float, burst: float, cost: float = 1.0) -> float:
+        """Token-bucket check: consume `cost` tokens and return 0, or return seconds until enough refill."""
+        ...
+
+    @abstractmethod
+    def acquire_lease(self, name: str, limit: int, ttl_seconds: float) -> Optional[str]:
+        """Take one of `limit` leases on `name` and return its id, or None if all are held."""
+        ...
+
+    @abstractmethod
+    def release_lease(self, name: str, lease_id: str):
+        ...
+
+    @abstractmethod
+    def renew_lease(self, name: str, lease_id: str, ttl_seconds: float):
+        """Extend a held lease; re-create it if it already expired."""
+        ...
+
+    @abstractmethod
+    def clear_leases(self):
+        """Drop every lease; only safe before any worker has started."""
+        ...
+
+    def close(self):
+        pass
+
+
+def _take_from_bucket(raw: Optional[bytes], now: float, rate_per_second: float, burst: float, cost: float) -> Tuple[bytes, float]:
+    tokens, updated_at = (float(x) for x in raw.split(b",")) if raw else (burst, now)
+    tokens = min(burst, tokens + (now - updated_at) * rate_per_second)
+    if tokens >= cost:
+        return f"{tokens - cost},{now}".encode(), 0.0
+    return f"{tokens},{now}".encode(), (cost - tokens) / rate_per_second
+
+
+class MemoryStore(SharedStore):
+    PURGE_EVERY = 256
+    SWEEP_INTERVAL_SECONDS = 60.0
+
+    def __init__(self):
+        self._data: Dict[str, Tuple[Optional[float], bytes]] = {}
+        self._leases: Dict[str, Dict[str, float]] = {}
+        self._lock = threading.Lock()
+        self._writes = 0
+        self._last_sweep = time.time()
+
+    def _wrote(self, now: float):
+        # Caller holds the lock. Keys that are never read again (rate-limit buckets,
+        # prefetch epochs) are only removed by this sweep.
+        self._writes += 1
+        if self._writes % self.PURGE_EVERY == 0 or now - self._last_sweep >= self.SWEEP_INTERVAL_SECONDS:
+            self._last_sweep = now
+            for key in [k for k, (expires_at, _) in self._data.items() if expires_at is not None and expires_at < now]:
+                del self._data[key]
+
+    def _get_live(self, key: str) -> Optional[bytes]:
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at is not None and expires_at < time.time():
+            del self._data[key]
+            return None
+        return value
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            return self._get_live(key)
+
+    def set(self, key: str, value: bytes, ttl_seconds: Optional[float] = None):
+        now = time.time()
+        expires_at = now + ttl_seconds if ttl_seconds is not None else None
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._wrote(now)
+
+    def delete(self, key: str):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def delete_prefix(self, prefix: str):
+        with self._lock:
+            for key in [k for k in self._data if k.startswith(prefix)]:
+                del self._data[key]
+
+    def incr(self, key: str, amount: int = 1, ttl_seconds: Optional[float] = None) -> int:
+        now = time.time()
+        expires_at = now + ttl_seconds if ttl_seconds is not None else None
+        with self._lock:
+            value = int(self._get_live(key) or 0) + amount
+            self._data[key] = (expires_at, str(value).encode())
+            self._wrote(now)
+            return value
+
+    def take_token(self, key: str, rate_per_second: float, burst: float, cost: float = 1.0) -> float:
+        now = time.time()
+        with self._lock:
+            value, wait = _take_from_bucket(self._get_live(key), now, rate_per_second, burst, cost)
+            self._data[key] = (now + burst / rate_per_second, value)
+            self._wrote(now)
+        return wait
+
+    def acquire_lease(self, name: str, limit: int, ttl_seconds: float) -> Optional[str]:
+        now = time.time()
+        with self._lock:
+            leases = self._leases.setdefault(name, {})
+            for lease_id in [i for i, expires_at in leases.items() if expires_at < now]:
+                del leases[lease_id]
+            if len(leases) >= limit:
+                return None
+            lease_id = uuid.uuid4().hex
+            leases[lease_id] = now + ttl_seconds
+            return lease_id
+
+    def release_lease(self, name: str, lease_id: str):
+        with self._lock:
+            self._leases.get(name, {}).pop(lease_id, None)
+
+    def renew_lease(self, name: str, lease_id: str, ttl_seconds: float):
+        with self._lock:
+            self._leases.setdefault(name, {})[lease_id] = time.time() + ttl_seconds
+
+    def clear_leases(self):
+        with self._lock:
+            self._leases.clear()
+
+
+class SQLiteStore(SharedStore):
+    PURGE_EVERY = 256
+
+    def __init__(self, path: str):
+        self._conn = sqlite3.connect(path, timeout=10, isolation_level=None, check_same_thread=False)
+        self._lock = threading.Lock()
+        self._writes = 0
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS kv (key TEXT PRIMARY KEY, value BLOB NOT NULL, expires_at REAL)"
+            )
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS leases (id TEXT PRIMARY KEY, name TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value FROM kv WHERE key = ? AND (expires_at IS NULL OR expires_at >= ?)",
+                (key, time.time()),
+            ).fetchone()
+        return row[0] if row else None
+
+    def set(self, key: str, value: bytes, ttl_seconds: Optional[float] = None):
+        now = time.time()
+        expires_at = now + ttl_seconds if ttl_seconds is not None else None
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO kv VALUES (?, ?, ?)", (key, value, expires_at))
+            self._wrote(now)
+
+    def _wrote(self, now: float):
+        # Caller holds the lock; counts writes from set, incr and take_token alike
+        self._writes += 1
+        if self._writes % self.PURGE_EVERY == 0:
+            self._conn.execute("DELETE FROM kv WHERE expires_at < ?", (now,))
+
+    def delete(self, key: str):
+        with self._lock:
+            self._conn.execute("DELETE FROM kv WHERE key = ?", (key,))
+
+    def delete_prefix(self, prefix: str):
+        with self._lock:
+            self._conn.execute("DELETE FROM kv WHERE substr(key, 1, ?) = ?", (len(prefix), prefix))
+
+    def incr(self, key: str, amount: int = 1, ttl_seconds: Optional[float] = None) -> int:
+        now = time.time()
+        expires_at = now + ttl_seconds if ttl_seconds is not None else None
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    "SELECT value FROM kv WHERE key = ? AND (expires_at IS NULL OR expires_at >= ?)",
+                    (key, now),
+                ).fetchone()
+                value = int(row[0] if row else 0) + amount
+                self._conn.execute("INSERT OR REPLACE INTO kv VALUES (?, ?, ?)", (key, str(value).encode(), expires_at))
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._wrote(now)
+        return value
+
+    def take_token(self, key: str, rate_per_second: float, burst: float, cost: float = 1.0) -> float:
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    "SELECT value FROM kv WHERE key = ? AND (expires_at IS NULL OR expires_at >= ?)",
+                    (key, now),
+                ).fetchone()
+                value, wait = _take_from_bucket(row[0] if row else None, now, rate_per_second, burst, cost)
+                # A bucket left alone for burst / rate seconds is full again, so it can expire
+                self._conn.execute("INSERT OR REPLACE INTO kv VALUES (?, ?, ?)", (key, value, now + burst / rate_per_second))
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._wrote(now)
+        return wait
+
+    def acquire_lease(self, name: str, limit: int, ttl_seconds: float) -> Optional[str]:
+        now = time.time()
+        lease_id = uuid.uuid4().hex
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                # Leases of crashed workers expire instead of holding their slot forever
+                self._conn.execute("DELETE FROM leases WHERE name = ? AND expires_at < ?", (name, now))
+                (held,) = self._conn.execute("SELECT COUNT(*) FROM leases WHERE name = ?", (name,)).fetchone()
+                if held < limit:
+                    self._conn.execute("INSERT INTO leases VALUES (?, ?, ?)", (lease_id, name, now + ttl_seconds))
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        return lease_id if held < limit else None
+
+    def release_lease(self, name: str, lease_id: str):
+        with self._lock:
+            self._conn.execute("DELETE FROM leases WHERE id = ? AND name = ?", (lease_id, name))
 
-app = FastAPI()
+    def renew_lease(self, name: str, lease_id: str, ttl_seconds: float):
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO leases VALUES (?, ?, ?)", (lease_id, name, time.time() + ttl_seconds))
+
+    def clear_leases(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM leases")
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def create_store(backend: str = STATE_BACKEND) -> SharedStore:
+    if backend == "sqlite":
+        return SQLiteStore(STATE_PATH)
+    if backend == "memory":
+        return MemoryStore()
+    raise ValueError(f"Unknown AGUI_STATE_BACKEND: {backend!r} (expected 'memory' or 'sqlite')")
+
+
+store = create_store()
+
+
+# --- 6. Admission Control ---
+
+# 0 disables the per-client limit
+RATE_LIMIT_PER_MINUTE = float(os.getenv("AGUI_RATE_LIMIT_PER_MINUTE", "20"))
+RATE_LIMIT_BURST = float(os.getenv("AGUI_RATE_LIMIT_BURST", "5"))
+# Parallel generations the model server can run (llama.cpp --parallel), shared by all workers
+BACKEND_SLOTS = int(os.getenv("AGUI_BACKEND_SLOTS", "4"))
+# Held leases are renewed every third of this; a crashed worker's slot frees up after it
+SLOT_LEASE_TTL = float(os.getenv("AGUI_SLOT_LEASE_TTL", "30"))
+ADMISSION_QUEUE_LIMIT = int(os.getenv("AGUI_ADMISSION_QUEUE", "8"))
+ADMISSION_QUEUE_TIMEOUT = float(os.getenv("AGUI_ADMISSION_QUEUE_TIMEOUT", "15"))
+ADMISSION_POLL_SECONDS = 0.25
+
+
+class Priority(IntEnum):
+    INTERACTIVE = 0
+    PREFETCH = 1
+
+
+class AdmissionRejected(Exception):
+    def __init__(self, reason: str, retry_after: float):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    """
+    Caps concurrent generations across all workers at the backend's slot count.
+
+    Each generation holds a lease in the shared store, renewed while it runs.
+    Interactive requests wait in
+    a bounded per-process queue, polling for a lease freed by any worker, and are
+    rejected once the queue is full or the wait times out. Prefetch never queues:
+    it only runs when nobody is waiting here and at least one slot stays free for
+    interactive use, so with a single backend slot prefetch is disabled.
+    """
+
+    LEASE_NAME = "backend-slots"
+
+    def __init__(self, slots: int, queue_limit: int = ADMISSION_QUEUE_LIMIT, queue_timeout: float = ADMISSION_QUEUE_TIMEOUT,
+                 lease_ttl: float = SLOT_LEASE_TTL):
+        self.slots = max(1, slots)
+        self.prefetch_slots = self.slots - 1
+        self.queue_limit = queue_limit
+        self.queue_timeout = queue_timeout
+        self.lease_ttl = lease_ttl
+        self._waiting = 0
+        self._released = asyncio.Event()
+
+    async def _try_lease(self, limit: int) -> Optional[str]:
+        if limit <= 0:
+            return None
+        future = asyncio.ensure_future(asyncio.to_thread(store.acquire_lease, self.LEASE_NAME, limit, self.lease_ttl))
+        try:
+            return await asyncio.shield(future)
+        except asyncio.CancelledError:
+            # The store call still completes; hand back a lease it took on our behalf
+            future.add_done_callback(self._release_orphan)
+            raise
+
+    def _release_orphan(self, future: asyncio.Future):
+        if not future.cancelled() and future.exception() is None and future.result():
+            asyncio.ensure_future(self.release(future.result()))
+
+    async def acquire(self, priority: Priority) -> str:
+        if priority == Priority.PREFETCH:
+            lease_id = None if self._waiting else await self._try_lease(self.prefetch_slots)
+            if lease_id is None:
+                raise AdmissionRejected("Backend busy", retry_after=1)
+            return lease_id
+        if not self._waiting:
+            lease_id = await self._try_lease(self.slots)
+            if lease_id is not None:
+                return lease_id
+        if self._waiting >= self.queue_limit:
+            raise AdmissionRejected("Server is at capacity, please retry shortly", retry_after=2)
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.queue_timeout
+        self._waiting += 1
+        try:
+            while True:
+                self._released.clear()
+                lease_id = await self._try_lease(self.slots)
+                if lease_id is not None:
+                    return lease_id
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    raise AdmissionRejected("Timed out waiting for a free generation slot", retry_after=2)
+                # Local releases wake us immediately; slots freed by other workers are seen on the next poll
+                try:
+                    await asyncio.wait_for(self._released.wait(), min(ADMISSION_POLL_SECONDS, remaining))
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            self._waiting -= 1
+
+    async def release(self, lease_id: str):
+        await asyncio.to_thread(store.release_lease, self.LEASE_NAME, lease_id)
+        self._released.set()
+
+    async def _keep_alive(self, lease_id: str):
+        # Long generations outlive the TTL; without renewal their slot would be handed out twice
+        while True:
+            await asyncio.sleep(self.lease_ttl / 3)
+            await asyncio.to_thread(store.renew_lease, self.LEASE_NAME, lease_id, self.lease_ttl)
+
+    @asynccontextmanager
+    async def slot(self, priority: Priority):
+        lease_id = await self.acquire(priority)
+        keep_alive = asyncio.create_task(self._keep_alive(lease_id))
+        try:
+            yield
+        finally:
+            keep_alive.cancel()
+            await asyncio.gather(keep_alive, return_exceptions=True)
+            await asyncio.shield(self.release(lease_id))
+
+
+admission = AdmissionController(BACKEND_SLOTS)
+
+
+class AdmissionControlMiddleware:
+    """
+    Per-client token bucket in front of the generation endpoints.
+
+    Clients are identified by peer IP only: client-supplied headers must never
+    open a fresh allowance. Buckets live in the shared store so the limit holds
+    across workers.
+    """
+
+    def __init__(self, app, paths: Tuple[str, ...] = ("/chat",)):
+        self.app = app
+        self.paths = paths
+        self.rate_per_second = RATE_LIMIT_PER_MINUTE / 60
+
+    async def __call__(self, scope, receive, send):
+        if (
+            scope["type"] != "http"
+            or scope["method"] == "OPTIONS"
+            or scope["path"] not in self.paths
+            or self.rate_per_second <= 0
+        ):
+            await self.app(scope, receive, send)
+            return
+        client = scope.get("client") or ("unknown", 0)
+        wait = await asyncio.to_thread(store.take_token, f"ratelimit:{client[0]}", self.rate_per_second, RATE_LIMIT_BURST)
+        if wait > 0:
+            await rejection_response(AdmissionRejected("Rate limit exceeded", retry_after=wait))(scope, receive, send)
+            return
+        await self.app(scope, receive, send)
+
+
+def rejection_response(error: AdmissionRejected) -> JSONResponse:
+    return JSONResponse(
+        status_code=429,
+        content={"detail": error.reason},
+        headers={"Retry-After": str(max(1, math.ceil(error.retry_after)))},
+    )
+
+
+# --- 7. Answer Store ---
+
+ANSWER_DIR = os.getenv("AGUI_ANSWER_DIR", ".agui_answers")
+ANSWER_PAGE_LIMIT = 50
+INDEX_READ_CHUNK = 8192
+_DIGEST_RE = re.compile(r"^[0-9a-f]{64}$")
+
+
+class AnswerStore:
+    """
+    Content-addressed, gzip-compressed store of validated AGUIResponse payloads.
+
+    Answers live under `objects/<sha256[:2]>/<sha256[2:]>.json.gz`, so identical
+    answers are stored once. Each session has an append-only JSONL index of
+    (answer id, prompt, timestamp); history pages are read backwards from a byte
+    offset, so loading one page never reads the whole index.
+    """
+
+    def __init__(self, root: str = ANSWER_DIR):
+        # Directories are created on first write, so importing this module touches no files
+        self.root = root
+
+    def _object_path(self, digest: str) -> str:
+        return os.path.join(self.root, "objects", digest[:2], digest[2:] + ".json.gz")
+
+    def _index_path(self, session_id: str) -> str:
+        # Hash the session id so arbitrary client-supplied ids map to safe file names
+        name = hashlib.sha256(session_id.encode("utf-8")).hexdigest()
+        return os.path.join(self.root, "sessions", name + ".jsonl")
+
+    @staticmethod
+    def digest(body: bytes) -> str:
+        return hashlib.sha256(body).hexdigest()
+
+    def put(self, body: bytes, digest: str):
+        path = self._object_path(digest)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(gzip.compress(body, compresslevel=6, mtime=0))
+            # Atomic, so concurrent writers of the same answer never expose a partial file
+            os.replace(tmp_path, path)
+
+    def save(self, body: bytes, digest: str, session_id: str, prompt: str):
+        """Store an answer and append it to the session index; runs after the response is sent."""
+        try:
+            self.put(body, digest)
+            self.record(session_id, digest, prompt)
+        except OSError as e:
+            # History is best effort; the user already has the answer
+            logger.warning(f"Failed to persist answer {digest}: {e}")
+
+    def get_compressed(self, digest: str) -> Optional[bytes]:
+        if not _DIGEST_RE.match(digest):
+            return None
+        try:
+            with open(self._object_path(digest), "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def record(self, session_id: str, digest: str, prompt: str):
+        line = _dumps({"id": digest, "prompt": prompt, "timestamp": time.time()}) + b"\n"
+        path = self._index_path(session_id)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # A single O_APPEND write keeps lines from different workers intact
+        with open(path, "ab") as f:
+            f.write(line)
+
+    def page(self, session_id: str, before: Optional[int] = None, limit: int = 20) -> Tuple[List[dict], Optional[int]]:
+        """
+        Return up to `limit` index entries ending at byte offset `before` (default: the
+        newest), oldest first, plus the cursor of the next older page (None at the start).
+        """
+        path = self._index_path(session_id)
+        try:
+            with open(path, "rb") as f:
+                size = f.seek(0, os.SEEK_END)
+                end = size if before is None else min(before, size)
+                start, chunk = end, b""
+                # One extra newline guarantees `limit` complete lines after dropping a partial first one
+                while start > 0 and chunk.count(b"\n") <= limit:
+                    step = min(INDEX_READ_CHUNK, start)
+                    start -= step
+                    f.seek(start)
+                    chunk = f.read(step) + chunk
+        except FileNotFoundError:
+            return [], None
+        # Ignore a trailing line another worker is still appending
+        chunk = chunk[:chunk.rfind(b"\n") + 1]
+        end = start + len(chunk)
+        if start > 0:
+            chunk = chunk[chunk.find(b"\n") + 1:]
+        lines = chunk.splitlines(keepends=True)[-limit:]
+        page_start = end - sum(len(line) for line in lines)
+        entries = []
+        for line in lines:
+            try:
+                entries.append(json.loads(line))
+            except ValueError:
+                logger.warning(f"Skipping malformed line in {path}")
+        return entries, (page_start if page_start > 0 else None)
+
+    def stream_page(self, entries: List[dict]):
+        """Yield one NDJSON line per entry, splicing the stored JSON in without re-parsing it."""
+        for entry in entries:
+            compressed = self.get_compressed(entry["id"])
+            if compressed is None:
+                continue
+            yield (
+                b'{"id":' + _dumps(entry["id"])
+                + b',"prompt":' + _dumps(entry["prompt"])
+                + b',"timestamp":' + _dumps(entry["timestamp"])
+                + b',"response":' + gzip.decompress(compressed) + b"}\n"
+            )
+
+
+answer_store = AnswerStore()
+
+
+# --- 8. FastAPI Server Setup ---
+
+warmup_state = {"schemas": False, "model_client": False, "startup_seconds": None}
+
+
+def warmup():
+    """Load the model client and build the schemas the first request would otherwise pay for."""
+    client = get_openai_client()
+    # Building the client imports the SDK's response parsing; touch it so the first parse() is cheap
+    client.chat.completions
+    warmup_state["model_client"] = True
+
+    AGUIResponse.model_json_schema()
+    app.openapi()
+    warmup_state["schemas"] = True
+    warmup_state["startup_seconds"] = round(time.perf_counter() - _process_started, 3)
+    logger.info(f"Warmup complete after {warmup_state['startup_seconds']}s")
+
+
+def _warmup_done(task: asyncio.Task):
+    if not task.cancelled() and task.exception() is not None:
+        logger.error("Warmup failed", exc_info=task.exception())
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Warm up in the background so the server starts listening (and answering /ready) immediately
+    warmup_task = asyncio.create_task(asyncio.to_thread(warmup))
+    warmup_task.add_done_callback(_warmup_done)
+    yield
+    # uvicorn has already drained in-flight requests (up to --graceful-timeout);
+    # drop speculative work so the worker can exit promptly.
+    await prefetcher.shutdown()
+    await asyncio.to_thread(store.close)
+
+app = FastAPI(lifespan=lifespan)
+
+# Registered before CORS so it runs inside it and 429s still carry CORS headers
+app.add_middleware(AdmissionControlMiddleware, paths=("/chat",))
 
 # Allow CROSS-ORIGIN requests (Frontend usually runs on port 3000 or 5173)
 app.add_middleware(
@@ -189,22 +1023,177 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-AGUI-Answer-Id", "X-Next-Cursor", "Retry-After"],
 )
 
+@app.exception_handler(AdmissionRejected)
+async def admission_rejected_handler(request: Request, exc: AdmissionRejected):
+    return rejection_response(exc)
+
+async def compressed_response(http_request: Request, body: bytes, media_type: str = "application/json") -> Response:
+    """Build a response, compressing bodies above the size threshold with br (if available) or gzip."""
+    headers = {"Vary": "Accept-Encoding"}
+    if len(body) >= COMPRESS_MIN_BYTES:
+        accepted = _accepted_encodings(http_request.headers.get("accept-encoding", ""))
+        compress = None
+        if brotli is not None and "br" in accepted:
+            compress = lambda data: brotli.compress(data, quality=5)
+            headers["Content-Encoding"] = "br"
+        elif "gzip" in accepted:
+            compress = lambda data: gzip.compress(data, compresslevel=6)
+            headers["Content-Encoding"] = "gzip"
+        if compress is not None:
+            # Large (table-heavy) payloads are compressed off the event loop
+            body = await asyncio.to_thread(compress, body) if len(body) >= COMPRESS_OFFLOAD_BYTES else compress(body)
+    return Response(content=body, media_type=media_type, headers=headers)
+
 class ChatRequest(BaseModel):
     message: str
     history: Optional[List] = []
+    session_id: Optional[str] = None
+
+class PrefetchCancelRequest(BaseModel):
+    session_id: str
 
 @app.post("/chat", response_model=AGUIResponse)
-async def chat_endpoint(request: ChatRequest):
+async def chat_endpoint(request: ChatRequest, http_request: Request):
     try:
         # Currently only message (prompt) is used, history handling can be added later
-        response = generate_ag_ui_response(request.message)
-        return response
+        response = None
+        if request.session_id:
+            response = await prefetcher.take(request.session_id, request.message)
+            if response is not None:
+                logger.info(f"Prefetch hit for session {request.session_id}")
+        if response is None:
+            prefetcher.interactive_started()
+            try:
+                async with admission.slot(Priority.INTERACTIVE):
+                    response = await asyncio.to_thread(generate_ag_ui_response, request.message)
+            finally:
+                prefetcher.interactive_finished()
+        if request.session_id and response.suggestions:
+            await prefetcher.schedule(request.session_id, response.suggestions)
+        # Returning a Response directly skips FastAPI's re-validation against response_model
+        columnar = http_request.headers.get("x-agui-table-encoding", "").lower() == "columnar"
+        # The plain encoding is only built when it is sent or stored
+        body = encode_agui_response(response) if request.session_id or not columnar else None
+        payload = encode_agui_response(response, columnar=True) if columnar else body
+        http_response = await compressed_response(http_request, payload)
+        if request.session_id:
+            digest = answer_store.digest(body)
+            http_response.headers["X-AGUI-Answer-Id"] = digest
+            # Compressing and writing the answer happens after the response is sent
+            http_response.background = BackgroundTask(answer_store.save, body, digest, request.session_id, request.message)
+        return http_response
+    except AdmissionRejected:
+        raise
     except Exception as e:
         logger.error(f"Error processing request: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/answers/{answer_id}", response_model=AGUIResponse)
+async def answer_endpoint(answer_id: str, http_request: Request):
+    # Content-addressed, so the stored gzip bytes can be served as-is and cached forever
+    compressed = await asyncio.to_thread(answer_store.get_compressed, answer_id)
+    if compressed is None:
+        raise HTTPException(status_code=404, detail="Answer not found")
+    headers = {"ETag": f'"{answer_id}"', "Cache-Control": "public, max-age=31536000, immutable", "Vary": "Accept-Encoding"}
+    if "gzip" in _accepted_encodings(http_request.headers.get("accept-encoding", "")):
+        headers["Content-Encoding"] = "gzip"
+        return Response(content=compressed, media_type="application/json", headers=headers)
+    return Response(content=gzip.decompress(compressed), media_type="application/json", headers=headers)
+
+@app.get("/sessions/{session_id}/answers")
+async def session_answers_endpoint(session_id: str, cursor: Optional[int] = None, limit: int = 20):
+    """
+    Stream a page of the session's past answers as NDJSON (oldest first within the page).
+    Without `cursor` this is the newest page; `X-Next-Cursor` points at the next older one.
+    """
+    if (cursor is not None and cursor < 0) or not 1 <= limit <= ANSWER_PAGE_LIMIT:
+        raise HTTPException(status_code=400, detail=f"cursor must be >= 0 and limit between 1 and {ANSWER_PAGE_LIMIT}")
+    entries, next_cursor = await asyncio.to_thread(answer_store.page, session_id, cursor, limit)
+    headers = {"X-Next-Cursor": str(next_cursor)} if next_cursor is not None else {}
+    return StreamingResponse(answer_store.stream_page(entries), media_type="application/x-ndjson", headers=headers)
+
+@app.get("/ready")
+async def readiness_endpoint():
+    ready = warmup_state["schemas"] and warmup_state["model_client"]
+    return JSONResponse(status_code=200 if ready else 503, content={"ready": ready, **warmup_state})
+
+@app.post("/prefetch/cancel")
+async def cancel_prefetch_endpoint(request: PrefetchCancelRequest):
+    # Called by the frontend as soon as the user starts typing their own question
+    return {"cancelled": await prefetcher.cancel(request.session_id)}
+
+def profile_startup(top: int = 20):
+    """Print an import-time breakdown of this module, grouped by top-level package, plus warmup time."""
+    import subprocess
+    import sys
+
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import agent_server"],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        capture_output=True,
+        text=True,
+    )
+    packages: Dict[str, int] = {}
+    total_us = 0
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        package = name.strip().split(".")[0]
+        packages[package] = packages.get(package, 0) + int(self_us)
+        if not name.startswith("  "):
+            total_us += int(cumulative_us)
+
+    print(f"Import time: {total_us / 1000:.1f} ms total")
+    for package, self_us in sorted(packages.items(), key=lambda item: -item[1])[:top]:
+        print(f"  {package:<30} {self_us / 1000:8.1f} ms")
+
+    started = time.perf_counter()
+    warmup()
+    print(f"Warmup (model client + schemas): {(time.perf_counter() - started) * 1000:.1f} ms")
+
+
 if __name__ == "__main__":
-    # Start Server, Default port 8000
-    uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
+    import argparse
+
+    parser = argparse.ArgumentParser(description="AG-UI agent server")
+    parser.add_argument("--host", default=os.getenv("AGUI_HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("AGUI_PORT", "8000")))
+    parser.add_argument("--workers", type=int, default=int(os.getenv("AGUI_WORKERS", "1")),
+                        help="Worker processes; 0 means one per CPU core")
+    parser.add_argument("--graceful-timeout", type=float, default=float(os.getenv("AGUI_GRACEFUL_TIMEOUT", "60")),
+                        help="Seconds to let in-flight generations finish on shutdown")
+    parser.add_argument("--profile-startup", action="store_true",
+                        help="Print an import-time breakdown and warmup cost, then exit")
+    args = parser.parse_args()
+
+    if args.profile_startup:
+        profile_startup()
+        raise SystemExit(0)
+
+    import uvicorn
+
+    workers = args.workers or os.cpu_count() or 1
+    if workers > 1:
+        os.environ.setdefault("AGUI_STATE_BACKEND", "sqlite")
+    # Leases left behind by a previous run that was killed would hold backend slots until they expire
+    startup_store = create_store(os.getenv("AGUI_STATE_BACKEND", "memory"))
+    startup_store.clear_leases()
+    startup_store.close()
+
+    if workers == 1:
+        # Start Server, Default port 8000
+        uvicorn.run(app, host=args.host, port=args.port, timeout_graceful_shutdown=args.graceful_timeout)
+    else:
+        # Workers re-import this module, so they inherit the shared state settings through the environment
+        uvicorn.run(
+            "agent_server:app",
+            app_dir=os.path.dirname(os.path.abspath(__file__)),
+            host=args.host,
+            port=args.port,
+            workers=workers,
+            timeout_graceful_shutdown=args.graceful_timeout,
+        )
\ No newline at end of file
@@ -1,14 +1,80 @@
 // services/geminiService.ts
 // Originally it was direct import { GoogleGenAI } ...
+import { ChatMessage } from '../types';
+
+const API_BASE = String(import.meta.env.VITE_API_URL).replace(/\/chat\/?$/, '');
+
+// Stable per-browser session id, used by the backend to key prefetched suggestion answers
+export const getSessionId = (): string => {
+  let sessionId = localStorage.getItem('agui_session_id');
+  if (!sessionId) {
+    sessionId = crypto.randomUUID();
+    localStorage.setItem('agui_session_id', sessionId);
+  }
+  return sessionId;
+};
+
+// Columnar tables: each column is either a plain list or { dict, codes } (dictionary-encoded)
+const decodeColumn = (column: any): string[] =>
+  Array.isArray(column) ? column : column.codes.map((code: number) => column.dict[code]);
+
+const decodeColumnarTables = (data: any) => {
+  for (const component of data?.components || []) {
+    if (component.type === 'table' && component.encoding === 'columnar') {
+      const columns: string[][] = component.columns.map(decodeColumn);
+      component.rows = columns[0].map((_, r) => columns.map(column => column[r]));
+      delete component.columns;
+      delete component.encoding;
+    }
+  }
+  return data;
+};
 
 export const generateAGUIResponse = async (prompt: string, history: any[]) => {
   // Changed to call your Python backend
   const response = await fetch(import.meta.env.VITE_API_URL, {
     method: 'POST',
-    headers: { 'Content-Type': 'application/json' },
-    body: JSON.stringify({ message: prompt, history: history })
+    headers: {
+      'Content-Type': 'application/json',
+      'X-AGUI-Table-Encoding': 'columnar'
+    },
+    body: JSON.stringify({ message: prompt, history: history, session_id: getSessionId() })
   });
 
-  const data = await response.json();
+  if (!response.ok) {
+    // 429 = rate limited / server at capacity; Retry-After says when to try again
+    const error = await response.json().catch(() => ({}));
+    throw new Error(error.detail || `HTTP ${response.status}`);
+  }
+
+  const data = decodeColumnarTables(await response.json());
   return data; // Python backend will return JSON conforming to the AG-UI format
-};
\ No newline at end of file
+};
+
+// Tell the backend to drop speculative answers once the user types their own question
+export const cancelPrefetch = () => {
+  fetch(`${API_BASE}/prefetch/cancel`, {
+    method: 'POST',
+    headers: { 'Content-Type': 'application/json' },
+    body: JSON.stringify({ session_id: getSessionId() })
+  }).catch(() => undefined);
+};
+
+// Load one page of this session's past answers from the server's answer store.
+// Without a cursor this is the newest page; nextCursor points at the next older one (null at the start).
+export const loadSessionHistory = async (cursor?: string | null): Promise<{ messages: ChatMessage[]; nextCursor: string | null }> => {
+  const params = new URLSearchParams({ limit: '20' });
+  if (cursor) params.set('cursor', cursor);
+  const response = await fetch(`${API_BASE}/sessions/${encodeURIComponent(getSessionId())}/answers?${params}`);
+  if (!response.ok) throw new Error(`HTTP ${response.status}`);
+
+  const messages: ChatMessage[] = [];
+  for (const line of (await response.text()).split('\n')) {
+    if (!line.trim()) continue;
+    const entry = JSON.parse(line);
+    const timestamp = Math.round(entry.timestamp * 1000);
+    messages.push({ id: `${entry.id}-${timestamp}-q`, role: 'user', content: entry.prompt, timestamp });
+    messages.push({ id: `${entry.id}-${timestamp}-a`, role: 'model', data: entry.response, timestamp });
+  }
+  return { messages, nextCursor: response.headers.get('X-Next-Cursor') };
+};